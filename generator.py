@@ -1,14 +1,29 @@
 from __future__ import annotations
 
+import functools
+import hashlib
+import json
 import logging
 import os
 import re
+import shutil
 import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 from pathlib import Path
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Callable
 
-from google import genai
-from google.genai import types
-from youtube_transcript_api import YouTubeTranscriptApi
+import semantic_cache
+
+# google.genai (protobuf, httpx, pydantic models) and youtube_transcript_api
+# are slow to import, so they are imported on first use instead; this keeps
+# app start-up fast.
+if TYPE_CHECKING:
+    from google import genai
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +33,36 @@ logger = logging.getLogger(__name__)
 
 _GEMINI_MODEL = "gemini-2.5-flash"
 
+# Bump whenever a prompt changes so stale cached responses are not reused.
+_PROMPT_VERSION = "v2"
+
+# Long transcripts are refined as parallel windows (~4k tokens each at
+# ≈4 chars/token).  Each window also sees the tail of the previous one as
+# read-only context so sentences cut at a boundary are refined coherently.
+_REFINE_SINGLE_CALL_CHARS = 20_000
+_REFINE_WINDOW_CHARS = 16_000
+_REFINE_CONTEXT_CHARS = 400
+_REFINE_MAX_WORKERS = 8
+
+# LaTeX builds run in a throwaway directory on tmpfs when available.
+_SCRATCH_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# Opt-in on-disk cache of Gemini responses (set YTLN_CACHE=1 to enable).
+_CACHE_DIR = Path.home() / ".cache" / "yt-lecture-notes"
+_CACHE_TTL_SECONDS = 30 * 24 * 3600
+
+_VIDEO_ID_PATTERNS = tuple(
+    re.compile(p)
+    for p in (
+        r"(?:v=|youtu\.be/)([a-zA-Z0-9_-]{11})",
+        r"/embed/([a-zA-Z0-9_-]{11})",
+        r"/v/([a-zA-Z0-9_-]{11})",
+    )
+)
+
+# A whole line holding a markdown code fence (``` or ```latex etc.).
+_FENCE_RE = re.compile(r"(?m)^[ \t]*```.*(?:\n|$)")
+
 _SUBJECTS = ["Math", "Programming", "Chemistry", "Physics", "MachineLearning", "General"]
 
 _BASE_LATEX_RULES = """\
@@ -61,13 +106,52 @@ _SUBJECT_EXTRA: dict[str, str] = {
     "General": "",   # base rules are sufficient
 }
 
+# Static instructions are sent as the system instruction; the request
+# contents carry only the per-video text.
+_REFINE_INSTRUCTIONS = (
+    "You are an expert academic editor. Rewrite the raw lecture transcript below "
+    "into clean, well-structured written prose suitable for high-quality lecture notes.\n\n"
+    "Rules:\n"
+    "- Remove filler words (um, uh, you know, like, basically, right?, okay, so yeah…)\n"
+    "- Eliminate repetitions and false starts\n"
+    "- Fix incomplete or run-on sentences\n"
+    "- Group related ideas into natural paragraphs\n"
+    "- Preserve ALL technical content, equations, and examples exactly\n"
+    "- Convert spoken math (\"x squared plus two x\") to symbols (x² + 2x)\n"
+    "- Do NOT add new information; do NOT summarise or shorten significantly\n"
+    "- Output ONLY the refined transcript text — no headings, no markdown"
+)
+
+# Per-subject LaTeX instructions, built once at import.
+_LATEX_INSTRUCTIONS = MappingProxyType({
+    subject: (
+        f"Convert the following {subject} lecture transcript into professional LaTeX notes.\n\n"
+        f"{_BASE_LATEX_RULES}{extra}\n"
+        "- Use sections/subsections and itemize/enumerate for structure."
+    )
+    for subject, extra in _SUBJECT_EXTRA.items()
+})
+
+_CLASSIFY_INSTRUCTIONS = (
+    f"Classify the main subject of this lecture into exactly one of these categories:\n"
+    f"{', '.join(_SUBJECTS)}\n\n"
+    "Return ONLY the category name — no explanation, no quotes, nothing else."
+)
+
 
 # ---------------------------------------------------------------------------
 # Client factory
 # ---------------------------------------------------------------------------
 
+@functools.lru_cache(maxsize=4)
 def make_client(api_key: str) -> genai.Client:
-    """Return a configured Gemini client.  Create once per job and pass around."""
+    """Return a configured Gemini client.
+
+    Memoised per API key so repeated jobs reuse one HTTP connection pool
+    (and its TLS sessions) instead of constructing a fresh client each time.
+    """
+    from google import genai
+
     return genai.Client(api_key=api_key)
 
 
@@ -75,9 +159,23 @@ def make_client(api_key: str) -> genai.Client:
 # Stage 1 — fetch transcript
 # ---------------------------------------------------------------------------
 
-def get_youtube_transcript(url: str) -> str:
+def extract_video_id(url: str) -> str | None:
+    """Return the 11-character YouTube video ID in `url`, or None."""
+    for pattern in _VIDEO_ID_PATTERNS:
+        m = pattern.search(url)
+        if m:
+            return m.group(1)
+    return None
+
+
+def get_youtube_transcript(url: str, use_cache: bool = True) -> str:
     """Fetch the raw transcript from YouTube.
 
+    Fetched caption entries are cached under
+    ~/.cache/yt-lecture-notes/transcripts/ keyed by video ID, so re-running a
+    video does not hit YouTube again.  Pass ``use_cache=False`` to bypass the
+    cache (the fresh result still replaces the cached copy).
+
     Returns:
         Raw joined transcript string.
 
@@ -85,20 +183,28 @@ def get_youtube_transcript(url: str) -> str:
         ValueError: if the URL is invalid or has no captions.
         RuntimeError: if the API call fails for any other reason.
     """
-    video_id = _extract_video_id(url)
+    video_id = extract_video_id(url)
     if not video_id:
         raise ValueError(f"Could not extract a video ID from URL: {url!r}")
 
-    try:
-        api = YouTubeTranscriptApi()
-        fetched = api.fetch(video_id)
-        entries = fetched.to_raw_data()
-        raw = " ".join(e["text"] for e in entries).strip()
-    except Exception as exc:
-        raise RuntimeError(
-            f"Failed to fetch transcript for video '{video_id}': {exc}\n"
-            "Common causes: no captions, private video, region-restricted, subtitles disabled."
-        ) from exc
+    entries = _load_cached_transcript(video_id) if use_cache else None
+    if entries is None:
+        try:
+            from youtube_transcript_api import YouTubeTranscriptApi
+
+            api = YouTubeTranscriptApi()
+            fetched = api.fetch(video_id)
+            entries = fetched.to_raw_data()
+        except Exception as exc:
+            raise RuntimeError(
+                f"Failed to fetch transcript for video '{video_id}': {exc}\n"
+                "Common causes: no captions, private video, region-restricted, subtitles disabled."
+            ) from exc
+        _save_cached_transcript(video_id, entries)
+    else:
+        logger.info("Using cached transcript for video '%s'.", video_id)
+
+    raw = " ".join(map(itemgetter("text"), entries)).strip()
 
     if len(raw) < 200:
         raise ValueError(
@@ -114,29 +220,34 @@ def get_youtube_transcript(url: str) -> str:
 # Stage 2 — refine transcript
 # ---------------------------------------------------------------------------
 
-def refine_transcript(raw: str, client: genai.Client) -> str:
+def refine_transcript(
+    raw: str,
+    client: genai.Client,
+    on_chunk: Callable[[str], None] | None = None,
+) -> str:
     """Turn raw subtitle text into clean academic prose.
 
+    Transcripts longer than ``_REFINE_SINGLE_CALL_CHARS`` are split into
+    windows that are refined concurrently and joined in order.
+
+    If `on_chunk` is given the output is streamed to it as it becomes
+    available (token chunks for a single call, whole windows otherwise); the
+    return value is still the full cleaned text.
+
     Raises:
-        RuntimeError: if the Gemini call fails.
+        RuntimeError: if a Gemini call fails.
     """
-    prompt = (
-        "You are an expert academic editor. Rewrite the raw lecture transcript below "
-        "into clean, well-structured written prose suitable for high-quality lecture notes.\n\n"
-        "Rules:\n"
-        "- Remove filler words (um, uh, you know, like, basically, right?, okay, so yeah…)\n"
-        "- Eliminate repetitions and false starts\n"
-        "- Fix incomplete or run-on sentences\n"
-        "- Group related ideas into natural paragraphs\n"
-        "- Preserve ALL technical content, equations, and examples exactly\n"
-        "- Convert spoken math (\"x squared plus two x\") to symbols (x² + 2x)\n"
-        "- Do NOT add new information; do NOT summarise or shorten significantly\n"
-        "- Output ONLY the refined transcript text — no headings, no markdown\n\n"
-        f"Raw transcript:\n{raw}"
-    )
-
-    response = _call_gemini(client, prompt, temperature=0.3)
-    refined = _strip_fences(response)
+    if len(raw) < _REFINE_SINGLE_CALL_CHARS:
+        response = _call_gemini(
+            client,
+            f"Raw transcript:\n{raw}",
+            temperature=0.3,
+            system_instruction=_REFINE_INSTRUCTIONS,
+            on_chunk=on_chunk,
+        )
+        refined = _strip_fences(response)
+    else:
+        refined = _refine_windows(raw, client, on_chunk)
 
     if not refined:
         logger.warning("Refinement returned empty text; falling back to raw transcript.")
@@ -146,21 +257,125 @@ def refine_transcript(raw: str, client: genai.Client) -> str:
     return refined
 
 
+def _refine_windows(
+    raw: str,
+    client: genai.Client,
+    on_chunk: Callable[[str], None] | None,
+) -> str:
+    windows = _split_windows(raw, _REFINE_WINDOW_CHARS)
+    logger.info("Refining transcript in %d parallel windows.", len(windows))
+
+    def refine_window(i: int) -> str:
+        prompt = f"Raw transcript:\n{windows[i]}"
+        if i > 0:
+            context = windows[i - 1][-_REFINE_CONTEXT_CHARS:]
+            prompt = (
+                "Preceding context (already refined elsewhere — do NOT include it "
+                f"in your output):\n{context}\n\n{prompt}"
+            )
+        response = _call_gemini(
+            client, prompt, temperature=0.3, system_instruction=_REFINE_INSTRUCTIONS,
+        )
+        return _strip_fences(response) or windows[i]
+
+    pieces = []
+    with ThreadPoolExecutor(max_workers=min(_REFINE_MAX_WORKERS, len(windows))) as pool:
+        for piece in pool.map(refine_window, range(len(windows))):
+            if on_chunk is not None:
+                on_chunk(piece + "\n\n")
+            pieces.append(piece)
+    return "\n\n".join(pieces)
+
+
+def _split_windows(text: str, size: int) -> list[str]:
+    """Split `text` into consecutive chunks of about `size` chars at spaces."""
+    windows = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            space = text.rfind(" ", start + size // 2, end)
+            if space != -1:
+                end = space
+        windows.append(text[start:end].strip())
+        start = end
+    return [w for w in windows if w]
+
+
+# ---------------------------------------------------------------------------
+# Stage 2b — classify subject
+# ---------------------------------------------------------------------------
+
+def classify_subject(transcript: str, client: genai.Client) -> str:
+    """Return the best-matching subject category for the transcript.
+
+    Only the opening of the transcript is used, so this can run on the raw
+    transcript concurrently with `refine_transcript`.  Never raises; falls
+    back to "General" on any failure.
+    """
+    sample = transcript[:3500]
+    try:
+        answer = _call_gemini(
+            client,
+            f"Lecture transcript (opening):\n{sample}",
+            temperature=0.0,
+            system_instruction=_CLASSIFY_INSTRUCTIONS,
+        )
+    except RuntimeError:
+        logger.warning("Subject classification failed; defaulting to General.")
+        return "General"
+
+    for subject in _SUBJECTS:
+        if subject.lower() in answer.lower():
+            logger.info("Detected subject: %s", subject)
+            return subject
+
+    logger.warning("Unexpected classification output %r; defaulting to General.", answer)
+    return "General"
+
+
 # ---------------------------------------------------------------------------
 # Stage 3 — generate LaTeX
 # ---------------------------------------------------------------------------
 
-def generate_latex(transcript: str, client: genai.Client) -> str:
-    """Classify the transcript subject and generate subject-appropriate LaTeX.
+def generate_latex(
+    transcript: str,
+    client: genai.Client,
+    subject: str | None = None,
+    on_chunk: Callable[[str], None] | None = None,
+) -> str:
+    """Generate subject-appropriate LaTeX for the transcript.
+
+    Args:
+        transcript: Refined transcript text.
+        client:     Gemini client.
+        subject:    Subject from `classify_subject`.  Classified here if omitted.
+        on_chunk:   Optional callback receiving raw response chunks as they
+                    stream in (before fence stripping and validation).
+
+    With YTLN_SEMANTIC_CACHE=1, LaTeX previously generated for a
+    near-identical transcript is returned without calling the model.
 
     Raises:
         RuntimeError: if the Gemini call fails or returns empty content.
     """
-    subject = _classify_subject(transcript, client)
-    logger.info("Detected subject: %s", subject)
-
-    prompt = _build_latex_prompt(subject, transcript)
-    raw_latex = _call_gemini(client, prompt)
+    if subject is None:
+        subject = classify_subject(transcript, client)
+
+    embedding = semantic_cache.embed(transcript, client) if semantic_cache.enabled() else None
+    if embedding is not None:
+        cached = semantic_cache.lookup(embedding, _GEMINI_MODEL, _PROMPT_VERSION, subject)
+        if cached is not None:
+            if on_chunk is not None:
+                on_chunk(cached)
+            return cached
+
+    raw_latex = _call_gemini(
+        client,
+        f"Transcript:\n{transcript}",
+        system_instruction=_LATEX_INSTRUCTIONS.get(subject, _LATEX_INSTRUCTIONS["General"]),
+        on_chunk=on_chunk,
+    )
     latex = _strip_fences(raw_latex)
 
     if not latex or "\\documentclass" not in latex:
@@ -169,6 +384,9 @@ def generate_latex(transcript: str, client: genai.Client) -> str:
             f"Response preview: {raw_latex[:300]!r}"
         )
 
+    if embedding is not None:
+        semantic_cache.insert(embedding, _GEMINI_MODEL, _PROMPT_VERSION, subject, latex)
+
     logger.info("Generated LaTeX (%d chars).", len(latex))
     return latex
 
@@ -181,19 +399,28 @@ def compile_pdf(
     latex: str,
     filename: str = "lecture_notes",
     output_dir: str | Path = ".",
+    write_source: bool = True,
 ) -> Path:
-    """Compile a LaTeX string to PDF using pdflatex (two passes).
+    """Compile a LaTeX string to PDF.
+
+    Engines are tried in order of speed: tectonic (single binary with a
+    persistent package/format cache), then latexmk (reruns pdflatex only as
+    often as needed), then two plain pdflatex passes.  Compilation is
+    skipped when the previous build in `output_dir` was of byte-identical
+    source (kept as `filename`.<hash>.pdf, hard-linked to `filename`.pdf).
 
     Args:
-        latex:      Full LaTeX source.
-        filename:   Base name (without extension) for output files.
-        output_dir: Directory in which to write all files.
+        latex:        Full LaTeX source.
+        filename:     Base name (without extension) for output files.
+        output_dir:   Directory in which to write all files.
+        write_source: Also save `latex` as `filename`.tex in `output_dir`.
+                      Pass False when the caller has already written it there.
 
     Returns:
         Path to the produced PDF.
 
     Raises:
-        FileNotFoundError: if pdflatex is not installed.
+        FileNotFoundError: if no LaTeX engine is installed.
         RuntimeError:      if compilation fails (includes log tail for debugging).
     """
     output_dir = Path(output_dir).resolve()
@@ -201,34 +428,60 @@ def compile_pdf(
 
     tex_file = output_dir / f"{filename}.tex"
     pdf_file = output_dir / f"{filename}.pdf"
-    log_file = output_dir / f"{filename}.log"
 
-    tex_file.write_text(latex, encoding="utf-8")
-    logger.info("Wrote %s.", tex_file)
+    if write_source:
+        tex_file.write_text(latex, encoding="utf-8")
+        logger.info("Wrote %s.", tex_file)
+
+    # The latest build is kept under a content-addressed name (hard-linked to
+    # `filename`.pdf, so no extra disk space): if this exact source was
+    # compiled last time, reuse its PDF and skip the engine entirely.
+    digest = hashlib.sha256(latex.encode("utf-8")).hexdigest()[:12]
+    hashed_pdf = output_dir / f"{filename}.{digest}.pdf"
+    if hashed_pdf.exists():
+        _link_or_copy(hashed_pdf, pdf_file)
+        logger.info("LaTeX unchanged since last build; reused %s.", hashed_pdf.name)
+        return pdf_file
+
+    # Build in a RAM-backed scratch directory so the engine's many small
+    # intermediate writes (.aux, .log, .fls, …) never touch the disk; only
+    # the finished PDF is copied out.
+    with tempfile.TemporaryDirectory(prefix="ytln-", dir=_SCRATCH_DIR) as tmp:
+        build_dir = Path(tmp)
+        (build_dir / f"{filename}.tex").write_text(latex, encoding="utf-8")
+        built_pdf = build_dir / f"{filename}.pdf"
+        log_file = build_dir / f"{filename}.log"
+
+        try:
+            engine = _run_latex(build_dir, filename)
+        except subprocess.CalledProcessError as exc:
+            log_tail = _read_log_tail(log_file) if log_file.exists() else _tail(exc.stderr)
+            raise RuntimeError(
+                f"{exc.cmd[0]} failed:\n{log_tail}"
+            ) from exc
+        except FileNotFoundError as exc:
+            raise FileNotFoundError(
+                "No LaTeX engine found (tried tectonic, latexmk, pdflatex). "
+                "Install Tectonic (https://tectonic-typesetting.github.io/), "
+                "TeX Live (https://www.tug.org/texlive/) or MiKTeX (https://miktex.org/)."
+            ) from exc
+
+        if not built_pdf.exists():
+            log_tail = _read_log_tail(log_file)
+            raise RuntimeError(f"{engine} ran but produced no PDF.\n{log_tail}")
+
+        # Copy to a temp sibling and rename, so a failed or concurrent copy
+        # never leaves a truncated PDF under the name the shortcut trusts.
+        tmp_pdf = hashed_pdf.with_name(f".{hashed_pdf.name}.{threading.get_ident()}.tmp")
+        try:
+            shutil.copyfile(built_pdf, tmp_pdf)
+            os.replace(tmp_pdf, hashed_pdf)
+        finally:
+            tmp_pdf.unlink(missing_ok=True)
+
+    _link_or_copy(hashed_pdf, pdf_file)
+    _remove_stale_builds(output_dir, filename, keep=hashed_pdf)
 
-    original_cwd = os.getcwd()
-    try:
-        os.chdir(output_dir)
-        _run_pdflatex(filename)   # pass 1 — build structure
-        _run_pdflatex(filename)   # pass 2 — resolve cross-references
-    except subprocess.CalledProcessError as exc:
-        log_tail = _read_log_tail(log_file)
-        raise RuntimeError(
-            f"pdflatex failed on pass:\n{log_tail}"
-        ) from exc
-    except FileNotFoundError as exc:
-        raise FileNotFoundError(
-            "pdflatex not found. Install TeX Live (https://www.tug.org/texlive/) "
-            "or MiKTeX (https://miktex.org/)."
-        ) from exc
-    finally:
-        os.chdir(original_cwd)
-
-    if not pdf_file.exists():
-        log_tail = _read_log_tail(log_file)
-        raise RuntimeError(f"pdflatex ran but produced no PDF.\n{log_tail}")
-
-    _remove_aux_files(output_dir, filename)
     logger.info("PDF ready: %s", pdf_file)
     return pdf_file
 
@@ -237,104 +490,236 @@ def compile_pdf(
 # Private helpers
 # ---------------------------------------------------------------------------
 
-def _extract_video_id(url: str) -> str | None:
-    patterns = [
-        r"(?:v=|youtu\.be/)([a-zA-Z0-9_-]{11})",
-        r"/embed/([a-zA-Z0-9_-]{11})",
-        r"/v/([a-zA-Z0-9_-]{11})",
-    ]
-    for pattern in patterns:
-        m = re.search(pattern, url)
-        if m:
-            return m.group(1)
-    return None
-
-
 def _call_gemini(
     client: genai.Client,
     prompt: str,
     temperature: float = 1.0,
+    system_instruction: str | None = None,
+    on_chunk: Callable[[str], None] | None = None,
 ) -> str:
-    """Thin wrapper around Gemini generate_content with unified error handling."""
+    """Thin wrapper around Gemini generate_content with unified error handling.
+
+    When `on_chunk` is given the response is streamed with
+    generate_content_stream and every chunk is forwarded to it as it arrives.
+
+    When YTLN_CACHE=1, identical (model, prompt version, temperature,
+    instructions, prompt) requests are answered from the on-disk cache
+    instead of calling Gemini.
+    """
+    key = _cache_key(
+        _GEMINI_MODEL, _PROMPT_VERSION, str(temperature), system_instruction or "", prompt,
+    )
+    cached = _cache_get(key)
+    if cached is not None:
+        logger.info("Gemini cache hit (%s).", key[:12])
+        if on_chunk is not None:
+            on_chunk(cached)
+        return cached
+
+    from google.genai import types
+
+    config = types.GenerateContentConfig(
+        temperature=temperature,
+        system_instruction=system_instruction,
+    )
     try:
-        response = client.models.generate_content(
-            model=_GEMINI_MODEL,
-            contents=prompt,
-            config=types.GenerateContentConfig(temperature=temperature),
-        )
+        if on_chunk is None:
+            response = client.models.generate_content(
+                model=_GEMINI_MODEL, contents=prompt, config=config,
+            )
+            text = response.text or ""
+        else:
+            parts: list[str] = []
+            for chunk in client.models.generate_content_stream(
+                model=_GEMINI_MODEL, contents=prompt, config=config,
+            ):
+                if chunk.text:
+                    parts.append(chunk.text)
+                    on_chunk(chunk.text)
+            text = "".join(parts)
     except Exception as exc:
         raise RuntimeError(f"Gemini API call failed: {exc}") from exc
 
-    if not response.text:
+    if not text:
         raise RuntimeError("Gemini returned an empty response.")
 
-    return response.text.strip()
+    text = text.strip()
+    _cache_set(key, text)
+    return text
+
+
+def _transcript_cache_path(video_id: str) -> Path:
+    return _CACHE_DIR / "transcripts" / f"{video_id}.json"
+
+
+def _load_cached_transcript(video_id: str) -> list[dict] | None:
+    """Return cached caption entries, or None if missing or malformed."""
+    try:
+        text = _transcript_cache_path(video_id).read_text(encoding="utf-8")
+        entries = json.loads(text)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(entries, list) or not all(
+        isinstance(e, dict) and isinstance(e.get("text"), str) for e in entries
+    ):
+        logger.warning("Ignoring malformed cached transcript for '%s'.", video_id)
+        return None
+    return entries
+
+
+def _save_cached_transcript(video_id: str, entries: list[dict]) -> None:
+    path = _transcript_cache_path(video_id)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{video_id}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(entries), encoding="utf-8")
+        tmp.replace(path)
+    except OSError as exc:
+        logger.warning("Could not cache transcript for '%s': %s", video_id, exc)
+
+
+def _cache_enabled() -> bool:
+    return os.environ.get("YTLN_CACHE") == "1"
+
+
+def _cache_key(*parts: str) -> str:
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def _gemini_cache_path(key: str) -> Path:
+    return _CACHE_DIR / "gemini" / f"{key}.json"
+
+
+def _cache_get(key: str) -> str | None:
+    """Return the cached response for `key`, or None on miss / expiry.
+
+    Expired entries are deleted so the cache does not grow without bound.
+    """
+    if not _cache_enabled():
+        return None
+    path = _gemini_cache_path(key)
+    try:
+        if time.time() - path.stat().st_mtime > _CACHE_TTL_SECONDS:
+            path.unlink(missing_ok=True)
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))["text"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _cache_set(key: str, text: str) -> None:
+    """Store a response; failures are logged and otherwise ignored."""
+    if not _cache_enabled():
+        return
+    path = _gemini_cache_path(key)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{key}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps({"text": text}), encoding="utf-8")
+        tmp.replace(path)
+    except OSError as exc:
+        logger.warning("Could not write Gemini cache entry: %s", exc)
 
 
 def _strip_fences(text: str) -> str:
     """Remove markdown code fences that the model sometimes wraps output in."""
-    lines = [ln for ln in text.splitlines() if not ln.strip().startswith("```")]
-    return "\n".join(lines).strip()
+    return _FENCE_RE.sub("", text).strip()
 
 
-def _classify_subject(transcript: str, client: genai.Client) -> str:
-    """Return the best-matching subject category for the transcript."""
-    # Only the opening portion is needed for classification.
-    sample = transcript[:3500]
-    prompt = (
-        f"Classify the main subject of this lecture into exactly one of these categories:\n"
-        f"{', '.join(_SUBJECTS)}\n\n"
-        "Return ONLY the category name — no explanation, no quotes, nothing else.\n\n"
-        f"Lecture transcript (opening):\n{sample}"
-    )
+def _run_latex(directory: Path, filename: str) -> str:
+    """Build `filename`.tex inside `directory`.
 
-    try:
-        answer = _call_gemini(client, prompt, temperature=0.0)
-    except RuntimeError:
-        logger.warning("Subject classification failed; defaulting to General.")
-        return "General"
+    Runs every engine with cwd=directory rather than os.chdir, which is
+    process-wide and would race between concurrently compiling jobs.
 
-    for subject in _SUBJECTS:
-        if subject.lower() in answer.lower():
-            return subject
+    Tectonic fetches packages on demand and rejects some documents that
+    TeX Live builds, so when it fails the TeX Live engines are tried next;
+    if neither is installed, tectonic's error is raised.
 
-    logger.warning("Unexpected classification output %r; defaulting to General.", answer)
-    return "General"
+    Returns the name of the engine that was used.
+    """
+    tectonic_error = None
+    try:
+        subprocess.run(
+            ["tectonic", "-X", "compile", "--outdir", ".", f"{filename}.tex"],
+            cwd=directory,
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        return "tectonic"
+    except FileNotFoundError:
+        logger.info("tectonic not found; trying latexmk.")
+    except subprocess.CalledProcessError as exc:
+        logger.warning("tectonic failed; trying latexmk.\n%s", _tail(exc.stderr))
+        tectonic_error = exc
 
+    try:
+        subprocess.run(
+            ["latexmk", "-pdf", "-interaction=nonstopmode", "-silent", f"{filename}.tex"],
+            cwd=directory,
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        return "latexmk"
+    except FileNotFoundError:
+        logger.info("latexmk not found; falling back to two pdflatex passes.")
 
-def _build_latex_prompt(subject: str, transcript: str) -> str:
-    extra = _SUBJECT_EXTRA.get(subject, "")
-    package_line = _BASE_LATEX_RULES + extra
-    return (
-        f"Convert the following {subject} lecture transcript into professional LaTeX notes.\n\n"
-        f"{package_line}\n"
-        "- Use sections/subsections and itemize/enumerate for structure.\n\n"
-        f"Transcript:\n{transcript}"
-    )
+    try:
+        _run_pdflatex(directory, filename)   # pass 1 — build structure
+    except FileNotFoundError:
+        if tectonic_error is not None:
+            raise tectonic_error from None
+        raise
+    _run_pdflatex(directory, filename)   # pass 2 — resolve cross-references
+    return "pdflatex"
 
 
-def _run_pdflatex(filename: str) -> None:
+def _run_pdflatex(directory: Path, filename: str) -> None:
     subprocess.run(
         ["pdflatex", "-interaction=nonstopmode", f"{filename}.tex"],
+        cwd=directory,
         check=True,
         capture_output=True,
         text=True,
     )
 
 
+def _link_or_copy(src: Path, dst: Path) -> None:
+    """Atomically make `dst` a hard link to `src` (copy if linking fails)."""
+    if dst.exists() and os.path.samefile(src, dst):
+        return   # already linked; rename() onto the same inode is a no-op
+    tmp = dst.with_name(f".{dst.name}.{threading.get_ident()}.tmp")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def _remove_stale_builds(directory: Path, stem: str, keep: Path) -> None:
+    """Delete `stem`.<hash>.pdf files from earlier builds (non-fatal)."""
+    for f in directory.glob(f"{stem}.*.pdf"):
+        digest = f.name[len(stem) + 1:-len(".pdf")]
+        if f != keep and len(digest) == 12 and all(c in "0123456789abcdef" for c in digest):
+            try:
+                f.unlink()
+            except OSError:
+                pass
+
+
 def _read_log_tail(log_file: Path, lines: int = 40) -> str:
     """Return the last `lines` lines of the pdflatex log, or a placeholder."""
     if not log_file.exists():
         return "(no log file found)"
     text = log_file.read_text(encoding="utf-8", errors="replace")
-    return "\n".join(text.splitlines()[-lines:])
+    return _tail(text, lines)
 
 
-def _remove_aux_files(directory: Path, stem: str) -> None:
-    for ext in (".aux", ".out", ".toc", ".fls", ".fdb_latexmk"):
-        f = directory / f"{stem}{ext}"
-        if f.exists():
-            try:
-                f.unlink()
-            except OSError:
-                pass  # non-fatal — leave the file in place
\ No newline at end of file
+def _tail(text: str | None, lines: int = 40) -> str:
+    """Return the last `lines` lines of `text` (e.g. captured stderr)."""
+    if not text:
+        return "(no output captured)"
+    return "\n".join(text.splitlines()[-lines:])
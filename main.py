@@ -1,14 +1,18 @@
 from flask import Flask, request, jsonify, send_file, render_template
 from pathlib import Path
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+import queue
 import threading
 import uuid
 import logging
 
 from generator import (
     make_client,
+    extract_video_id,
     get_youtube_transcript,
     refine_transcript,
+    classify_subject,
     generate_latex,
     compile_pdf,
 )
@@ -26,14 +30,21 @@ jobs: dict[str, dict] = {}
 OUTPUT_BASE = Path("./outputs")
 OUTPUT_BASE.mkdir(exist_ok=True)
 
+# Jobs run on a shared pool so a batch of URLs overlaps its Gemini and
+# YouTube network I/O (and per-directory LaTeX compiles) across workers.
+MAX_WORKERS = 8
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="job")
+# Every submission to `executor` holds one slot until its job finishes, so a
+# job is only handed to the pool when a worker is actually free (see run_batch).
+worker_slots = threading.BoundedSemaphore(MAX_WORKERS)
+
 
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
 def _output_dir(url: str) -> Path:
-    from generator import _extract_video_id  # reuse the private helper
-    video_id = _extract_video_id(url)
+    video_id = extract_video_id(url)
     name = (
         f"lecture_{video_id}"
         if video_id
@@ -44,13 +55,48 @@ def _output_dir(url: str) -> Path:
     return out
 
 
-def run_job(job_id: str, url: str, api_key: str, generate_pdf_flag: bool) -> None:
-    """Execute the full generation pipeline in a background thread."""
+class _StreamWriter:
+    """Append streamed response chunks to a file as they arrive."""
+
+    def __init__(self, path: Path, on_progress=None) -> None:
+        self._fh = path.open("w", encoding="utf-8")
+        self._chars = 0
+        self._on_progress = on_progress
+
+    def __call__(self, chunk: str) -> None:
+        self._fh.write(chunk)
+        self._fh.flush()
+        self._chars += len(chunk)
+        if self._on_progress is not None:
+            self._on_progress(self._chars)
+
+    def __enter__(self) -> "_StreamWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._fh.close()
+
+
+def run_job(
+    job_id: str,
+    url: str,
+    client,
+    generate_pdf_flag: bool,
+    use_cache: bool = True,
+    raw_future=None,
+) -> None:
+    """Execute the full generation pipeline on a worker thread.
+
+    `client` is shared by every job in a batch; the Gemini client is safe to
+    use from several threads at once.  `raw_future`, if given, is a Future
+    holding the already-fetched raw transcript (see `run_batch`).
+    """
     job = jobs[job_id]
 
     def update(progress: int, message: str) -> None:
         job["progress"] = progress
         job["message"]  = message
+        logger.info("[%s] %s", url, message)
 
     def fail(message: str) -> None:
         job["status"]   = "error"
@@ -58,22 +104,36 @@ def run_job(job_id: str, url: str, api_key: str, generate_pdf_flag: bool) -> Non
         job["progress"] = 0
 
     try:
-        client  = make_client(api_key)
         out_dir = _output_dir(url)
         job["out_dir"] = str(out_dir)
 
         # ── Stage 1: fetch raw transcript ──────────────────────────────────
-        update(10, "Fetching transcript from YouTube…")
-        raw = get_youtube_transcript(url)
-
-        # ── Stage 2: refine transcript ─────────────────────────────────────
+        if raw_future is not None:
+            raw = raw_future.result()   # re-raises the fetch error, if any
+        else:
+            update(10, "Fetching transcript from YouTube…")
+            raw = get_youtube_transcript(url, use_cache)
+
+        # ── Stage 2: refine transcript (classify subject concurrently) ─────
+        # Classification only reads the opening of the transcript, so it runs
+        # on the raw text while the much longer refinement call is in flight.
         update(30, "Refining transcript with AI…")
-        transcript = refine_transcript(raw, client)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            subject_future = pool.submit(classify_subject, raw, client)
+            with _StreamWriter(out_dir / "transcript.txt") as sink:
+                transcript = refine_transcript(raw, client, on_chunk=sink)
+            subject = subject_future.result()
         (out_dir / "transcript.txt").write_text(transcript, encoding="utf-8")
 
         # ── Stage 3: generate LaTeX ────────────────────────────────────────
         update(55, "Generating LaTeX notes…")
-        latex = generate_latex(transcript, client)
+
+        def on_latex_progress(chars: int) -> None:
+            update(55, f"Generating LaTeX notes… ({chars:,} chars)")
+
+        with _StreamWriter(out_dir / "lecture_notes.tex", on_latex_progress) as sink:
+            latex = generate_latex(transcript, client, subject, on_chunk=sink)
+        # Rewrite with the cleaned (fence-stripped) source.
         (out_dir / "lecture_notes.tex").write_text(latex, encoding="utf-8")
 
         files = {
@@ -85,14 +145,15 @@ def run_job(job_id: str, url: str, api_key: str, generate_pdf_flag: bool) -> Non
         # ── Stage 4: compile PDF (optional) ───────────────────────────────
         if generate_pdf_flag:
             update(78, "Compiling PDF…")
-            pdf_path = compile_pdf(latex, "lecture_notes", out_dir)
+            # lecture_notes.tex was written above; don't write it a second time.
+            pdf_path = compile_pdf(latex, "lecture_notes", out_dir, write_source=False)
             files["pdf"] = str(pdf_path)
 
         job["files"]  = files
         job["status"] = "done"
         update(100, "All done!")
 
-    except FileNotFoundError as exc:   # pdflatex not installed
+    except FileNotFoundError as exc:   # no LaTeX engine installed
         fail(str(exc))
     except (ValueError, RuntimeError) as exc:
         fail(str(exc))
@@ -101,6 +162,47 @@ def run_job(job_id: str, url: str, api_key: str, generate_pdf_flag: bool) -> Non
         fail(f"Unexpected error: {exc}")
 
 
+def run_batch(
+    items: list[tuple[str, str]],
+    client,
+    generate_pdf_flag: bool,
+    use_cache: bool = True,
+) -> None:
+    """Run a batch of (job_id, url) jobs, prefetching transcripts ahead of time.
+
+    A producer thread downloads YouTube transcripts one at a time, staying at
+    most two jobs ahead of the workers, so the next job's network fetch
+    overlaps the current jobs' Gemini calls and LaTeX compiles.  Jobs are only
+    handed to the pool when one of the shared `worker_slots` is free (across
+    all batches and single jobs), which is what lets the queue fill up while
+    every worker is busy.
+    """
+    prefetched: queue.Queue = queue.Queue(maxsize=2)
+
+    def produce() -> None:
+        for job_id, url in items:
+            job = jobs[job_id]
+            job["progress"], job["message"] = 10, "Fetching transcript from YouTube…"
+            raw_future: Future = Future()
+            try:
+                raw_future.set_result(get_youtube_transcript(url, use_cache))
+                job["message"] = "Transcript ready; waiting for a free worker…"
+            except Exception as exc:
+                raw_future.set_exception(exc)
+            prefetched.put((job_id, url, raw_future))
+        prefetched.put(None)
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    while (item := prefetched.get()) is not None:
+        job_id, url, raw_future = item
+        worker_slots.acquire()
+        done = executor.submit(
+            run_job, job_id, url, client, generate_pdf_flag, use_cache, raw_future,
+        )
+        done.add_done_callback(lambda _: worker_slots.release())
+
+
 # ---------------------------------------------------------------------------
 # Routes
 # ---------------------------------------------------------------------------
@@ -112,31 +214,47 @@ def index():
 
 @app.route("/api/generate", methods=["POST"])
 def generate():
+    """Start one job per URL.
+
+    Accepts either ``url`` (single job, responds with ``job_id``) or a
+    ``urls`` list (batch, responds with ``job_ids`` in the same order).
+    """
     data         = request.get_json(force=True)
-    url          = (data.get("url")     or "").strip()
     api_key      = (data.get("api_key") or "").strip()
     generate_pdf = bool(data.get("generate_pdf", True))
+    use_cache    = bool(data.get("use_cache", True))
+
+    batch = isinstance(data.get("urls"), list)
+    raw_urls = data["urls"] if batch else [data.get("url")]
+    urls = [u.strip() for u in raw_urls if isinstance(u, str) and u.strip()]
+
+    if not urls or not api_key:
+        return jsonify({"error": "url (or urls) and api_key are required"}), 400
+
+    client = make_client(api_key)
+    job_ids = []
+    for url in urls:
+        job_id = str(uuid.uuid4())
+        jobs[job_id] = {
+            "status":   "running",
+            "progress": 0,
+            "message":  "Queued…",
+            "out_dir":  None,
+            "files":    {},
+            "error":    None,
+        }
+        job_ids.append(job_id)
 
-    if not url or not api_key:
-        return jsonify({"error": "url and api_key are required"}), 400
-
-    job_id = str(uuid.uuid4())
-    jobs[job_id] = {
-        "status":   "running",
-        "progress": 0,
-        "message":  "Starting…",
-        "out_dir":  None,
-        "files":    {},
-        "error":    None,
-    }
-
+    # Single jobs go through run_batch too, so every job shares worker_slots.
     threading.Thread(
-        target=run_job,
-        args=(job_id, url, api_key, generate_pdf),
+        target=run_batch,
+        args=(list(zip(job_ids, urls)), client, generate_pdf, use_cache),
         daemon=True,
     ).start()
 
-    return jsonify({"job_id": job_id})
+    if batch:
+        return jsonify({"job_ids": job_ids})
+    return jsonify({"job_id": job_ids[0]})
 
 
 @app.route("/api/status/<job_id>")
@@ -0,0 +1,201 @@
+"""Semantic cache: reuse generated LaTeX for near-duplicate transcripts.
+
+Exact-match caching misses re-uploads of the same lecture whose captions
+differ slightly.  This cache embeds the transcript chunk by chunk with
+Gemini.  It finds candidate documents through a persistent hnswlib index of
+mean embeddings, then accepts a candidate only if every aligned chunk pair
+reaches ``_THRESHOLD`` cosine similarity.  A mean over a whole lecture is
+pulled toward the course average, so two different lectures from one course
+can look alike on the mean alone; chunk-level agreement is what rules that
+out.
+
+Opt-in with YTLN_SEMANTIC_CACHE=1; also needs the optional ``hnswlib`` and
+``numpy`` packages.  Every failure degrades to a cache miss.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+
+# text-embedding-004 has been retired; gemini-embedding-001 truncated to 768
+# dimensions is its replacement (truncated vectors must be re-normalised).
+_EMBED_MODEL = "gemini-embedding-001"
+_DIM = 768
+_THRESHOLD = 0.95            # minimum cosine similarity for *every* chunk pair
+_CANDIDATES = 5
+
+# gemini-embedding-001 accepts 2048 tokens per input (≈ 8000 chars).  Long
+# transcripts are embedded as up to _MAX_CHUNKS evenly spaced chunks.
+_CHUNK_CHARS = 8000
+_MAX_CHUNKS = 32
+
+_CACHE_DIR = Path.home() / ".cache" / "yt-lecture-notes"
+_INDEX_PATH = _CACHE_DIR / "sem-v2.bin"
+_DB_PATH = _CACHE_DIR / "sem-v2.sqlite3"
+_INITIAL_CAPACITY = 1024
+
+_lock = threading.Lock()
+_index = None
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+def enabled() -> bool:
+    """Return True if the cache is switched on and its dependencies exist."""
+    if os.environ.get("YTLN_SEMANTIC_CACHE") != "1":
+        return False
+    if not all(importlib.util.find_spec(name) for name in ("hnswlib", "numpy")):
+        logger.warning("YTLN_SEMANTIC_CACHE=1 but hnswlib/numpy are not installed.")
+        return False
+    return True
+
+
+def embed(transcript: str, client) -> np.ndarray | None:
+    """Return unit-length per-chunk embeddings (n_chunks × _DIM), or None."""
+    step = max(_CHUNK_CHARS, -(-len(transcript) // _MAX_CHUNKS))
+    chunks = [transcript[i:i + _CHUNK_CHARS] for i in range(0, len(transcript), step)]
+    if not chunks:
+        return None
+    try:
+        import numpy as np
+        from google.genai import types
+
+        result = client.models.embed_content(
+            model=_EMBED_MODEL,
+            contents=chunks,
+            config=types.EmbedContentConfig(
+                task_type="SEMANTIC_SIMILARITY",
+                output_dimensionality=_DIM,
+            ),
+        )
+        vectors = np.array([e.values for e in result.embeddings], dtype=np.float32)
+    except Exception as exc:
+        logger.warning("Transcript embedding failed; skipping semantic cache: %s", exc)
+        return None
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    if not norms.all():
+        return None
+    return vectors / norms
+
+
+def lookup(chunks: np.ndarray, model: str, version: str, subject: str) -> str | None:
+    """Return cached LaTeX for a near-identical transcript, or None.
+
+    Only documents generated with the same model, prompt version and subject
+    are considered.
+    """
+    try:
+        import numpy as np
+
+        with _lock:
+            index = _load_index()
+            count = index.get_current_count()
+            if count == 0:
+                return None
+            labels, _ = index.knn_query(_mean(chunks), k=min(_CANDIDATES, count))
+            with closing(_connect()) as db:
+                for label in labels[0]:
+                    row = db.execute(
+                        "SELECT chunks, latex FROM documents WHERE id = ? AND embed_model = ? "
+                        "AND model = ? AND prompt_version = ? AND subject = ?",
+                        (int(label), _EMBED_MODEL, model, version, subject),
+                    ).fetchone()
+                    if row is None:
+                        continue
+                    stored = np.frombuffer(row[0], dtype=np.float32).reshape(-1, _DIM)
+                    similarity = _chunk_similarity(chunks, stored)
+                    if similarity >= _THRESHOLD:
+                        logger.info("Semantic cache hit (min chunk similarity %.3f).", similarity)
+                        return row[1]
+    except Exception as exc:
+        logger.warning("Semantic cache lookup failed: %s", exc)
+    return None
+
+
+def insert(chunks: np.ndarray, model: str, version: str, subject: str, latex: str) -> None:
+    """Record `latex` as the output for a transcript with these embeddings."""
+    try:
+        with _lock:
+            index = _load_index()
+            with closing(_connect()) as db, db:
+                doc_id = db.execute(
+                    "INSERT INTO documents "
+                    "(embed_model, model, prompt_version, subject, chunks, latex) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (_EMBED_MODEL, model, version, subject, chunks.tobytes(), latex),
+                ).lastrowid
+            if index.get_current_count() >= index.get_max_elements():
+                index.resize_index(2 * index.get_max_elements())
+            index.add_items(_mean(chunks).reshape(1, -1), [doc_id])
+            index.save_index(str(_INDEX_PATH))
+    except Exception as exc:
+        logger.warning("Semantic cache insert failed: %s", exc)
+
+
+# ---------------------------------------------------------------------------
+# Private helpers
+# ---------------------------------------------------------------------------
+
+def _mean(chunks: np.ndarray) -> np.ndarray:
+    import numpy as np
+
+    mean = chunks.mean(axis=0)
+    return mean / np.linalg.norm(mean)
+
+
+def _chunk_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Minimum cosine similarity over position-aligned chunks.
+
+    Chunk counts may differ by one when a small length change crosses a
+    chunk boundary; a bigger difference means a different lecture.
+    """
+    if abs(len(a) - len(b)) > 1:
+        return 0.0
+    n = min(len(a), len(b))
+    return float((a[:n] * b[:n]).sum(axis=1).min())
+
+
+def _load_index():
+    """Return the process-wide index, loading it from disk on first use."""
+    global _index
+    if _index is None:
+        import hnswlib
+
+        _CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        index = hnswlib.Index(space="cosine", dim=_DIM)
+        if _INDEX_PATH.exists():
+            index.load_index(str(_INDEX_PATH))
+        else:
+            index.init_index(max_elements=_INITIAL_CAPACITY, ef_construction=200, M=16)
+        _index = index
+    return _index
+
+
+def _connect() -> sqlite3.Connection:
+    db = sqlite3.connect(_DB_PATH)
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS documents ("
+        "id INTEGER PRIMARY KEY, embed_model TEXT NOT NULL, model TEXT NOT NULL, "
+        "prompt_version TEXT NOT NULL, subject TEXT NOT NULL, "
+        "chunks BLOB NOT NULL, latex TEXT NOT NULL)"
+    )
+    return db